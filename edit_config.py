@@ -2,156 +2,340 @@
 Interactive configuration editor for Economic Paper Introduction Analyzer
 """
 
+import copy
+import hashlib
 import json
 import os
+import sys
 from pathlib import Path
 
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the stdlib encoder
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # msgpack is optional; without it no binary sidecar is kept
+    msgpack = None
+
+try:
+    import msgspec
+except ImportError:  # msgspec is optional; without it config.json is parsed untyped
+    msgspec = None
+
+# Default value of every setting, per config section. This is the one place defaults live:
+# create_default_config(), the msgspec schema below and step2's fallback are all built from it.
+_DEFAULT_SETTINGS = {
+    "llm_settings": {
+        "model": "qwen-plus",
+        "temperature": 0.0,
+        "max_tokens": 16000,
+        "top_p": 0.8,
+        "concurrency": 4,
+        "max_batch_size": 4,
+        "max_input_tokens": 32000,
+        "tokens_per_section": 256,
+        "context_window": 131072
+    },
+    "extraction_settings": {
+        "case_sensitive": False,
+        "fuzzy_matching": True,
+        "max_intro_length": 32000,
+        "fallback_intro_length": 20000,
+        "search_flexibility": True,
+        "fuzzy_early_exit": 0.95,
+        "pdf_backend": "pdfplumber",
+        "max_intro_pages": 10
+    },
+    "output_settings": {
+        "save_raw_intros": True,
+        "markdown_format": True,
+        "include_metadata": True,
+        "use_cache": True
+    },
+    "rate_limits": {
+        "max_requests_per_minute": 600,
+        "max_tokens_per_minute": 1000000
+    }
+}
+
+_DEFAULT_PROMPT_TEMPLATE = {
+    "system_instruction": "You are an expert economist analyzing research papers. Focus on economic insights and contributions rather than technical details.",
+    "analysis_sections": [
+        "Research Problem",
+        "Significance & Motivation",
+        "Main Findings & Intuition", 
+        "Methodological Contributions",
+        "Key Insights"
+    ]
+}
+
+if msgspec is not None:
+    # One Struct per section, each field typed after its default value
+    def _section_struct(section_name, defaults):
+        name = "".join(part.title() for part in section_name.split("_"))
+        return msgspec.defstruct(name, [(key, type(value), value) for key, value in defaults.items()])
+
+    _SECTION_STRUCTS = {section_name: _section_struct(section_name, defaults)
+                        for section_name, defaults in _DEFAULT_SETTINGS.items()}
+    Config = msgspec.defstruct("Config", [
+        *((section_name, struct, msgspec.field(default_factory=struct))
+          for section_name, struct in _SECTION_STRUCTS.items()),
+        # Templates are keyed by paper type and edited by hand, so keep them free-form
+        ("prompt_template", dict, msgspec.field(default_factory=dict)),
+    ])
+
+def _fill_missing(data, defaults):
+    """Return data with keys it lacks taken from defaults, recursing into nested sections."""
+    merged = dict(data)
+    for key, value in defaults.items():
+        if key not in merged:
+            merged[key] = value
+        elif isinstance(merged[key], dict) and isinstance(value, dict):
+            merged[key] = _fill_missing(merged[key], value)
+    return merged
+
+def _parse_config_json(data):
+    """
+    Parse config.json bytes. When msgspec is available the settings sections are type-checked
+    and settings missing from the file are filled in from their defaults; keys the schema does
+    not know are kept as they are. Returns (config, schema), where schema is _SCHEMA_VERSION
+    if the config was checked and None otherwise.
+    """
+    config = _json_loads(data)
+    if msgspec is None or not isinstance(config, dict):
+        return config, None
+    try:
+        defaults = msgspec.to_builtins(msgspec.convert(config, Config))
+    except msgspec.ValidationError as e:
+        print(f"Warning: config.json does not match the expected schema ({e}); loading it unchecked")
+        return config, None
+    return _fill_missing(config, defaults), _SCHEMA_VERSION
+
+# Binary copy of config.json, rebuilt whenever the JSON file is newer
+CONFIG_CACHE_FILE = "config.msgpack"
+# Identifies the settings schema a sidecar was checked against, so a sidecar from an older
+# schema (or from a run without msgspec) is rebuilt instead of trusted
+_SCHEMA_VERSION = (hashlib.blake2b(json.dumps(_DEFAULT_SETTINGS, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+                   if msgspec is not None else None)
+
+def _json_dumps(obj):
+    """Serialize obj to indented UTF-8 JSON bytes."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, indent=2, ensure_ascii=False).encode('utf-8')
+
+def _json_loads(data):
+    """Parse JSON from bytes."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def _read_config_file(config_file, mtime):
+    """Parse config.json, preferring the msgpack sidecar when it is up to date."""
+    cache_file = Path(CONFIG_CACHE_FILE)
+    if msgpack is not None and cache_file.exists() and cache_file.stat().st_mtime_ns >= mtime:
+        try:
+            cached = msgpack.unpackb(cache_file.read_bytes(), raw=False)
+            if isinstance(cached, dict) and "config" in cached and cached.get("schema") == _SCHEMA_VERSION:
+                return cached["config"]
+        except (ValueError, msgpack.UnpackException):
+            pass  # Corrupt sidecar; rebuild it from the JSON below
+    
+    config, schema = _parse_config_json(Path(config_file).read_bytes())
+    _write_config_cache(config, schema)
+    return config
+
+def _write_config_cache(config, schema):
+    """Refresh the msgpack sidecar; failures only cost the next load a JSON parse."""
+    if msgpack is None:
+        return
+    try:
+        Path(CONFIG_CACHE_FILE).write_bytes(msgpack.packb({"schema": schema, "config": config}, use_bin_type=True))
+    except OSError as e:
+        print(f"Warning: could not write {CONFIG_CACHE_FILE}: {e}")
+
+# Parsed config.json, reused until the file's mtime changes
+_CFG_CACHE = {"mtime": 0, "data": None}
+
 def load_config():
     """Load current configuration."""
     config_file = "config.json"
     if Path(config_file).exists():
-        with open(config_file, 'r', encoding='utf-8') as f:
-            return json.load(f)
+        mtime = os.stat(config_file).st_mtime_ns
+        if mtime != _CFG_CACHE["mtime"] or _CFG_CACHE["data"] is None:
+            _CFG_CACHE["data"] = _read_config_file(config_file, mtime)
+            _CFG_CACHE["mtime"] = mtime
+        # Hand out a copy so callers can edit it without touching the cache
+        return copy.deepcopy(_CFG_CACHE["data"])
     else:
         print("Config file not found. Using defaults.")
         return create_default_config()
 
 def create_default_config():
     """Create default configuration."""
-    return {
-        "llm_settings": {
-            "model": "qwen-plus",
-            "temperature": 0,
-            "max_tokens": 16000,
-            "top_p": 0.8
-        },
-        "extraction_settings": {
-            "case_sensitive": False,
-            "fuzzy_matching": True,
-            "max_intro_length": 32000,
-            "fallback_intro_length": 20000,
-            "search_flexibility": True
-        },
-        "output_settings": {
-            "save_raw_intros": True,
-            "markdown_format": True,
-            "include_metadata": True,
-            "rate_limit_delay": 0.2,
-        },
-        "prompt_template": {
-            "system_instruction": "You are an expert economist analyzing research papers. Focus on economic insights and contributions rather than technical details.",
-            "analysis_sections": [
-                "Research Problem",
-                "Significance & Motivation",
-                "Main Findings & Intuition", 
-                "Methodological Contributions",
-                "Key Insights"
-            ]
-        }
-    }
+    config = copy.deepcopy(_DEFAULT_SETTINGS)
+    config["prompt_template"] = copy.deepcopy(_DEFAULT_PROMPT_TEMPLATE)
+    return config
 
 def save_config(config):
     """Save configuration to file."""
-    with open("config.json", 'w', encoding='utf-8') as f:
-        json.dump(config, f, indent=2, ensure_ascii=False)
+    Path("config.json").write_bytes(_json_dumps(config))
+    # Drop the sidecar; the next load rebuilds it from (and checks) the new file
+    try:
+        Path(CONFIG_CACHE_FILE).unlink(missing_ok=True)
+    except OSError as e:
+        print(f"Warning: could not remove {CONFIG_CACHE_FILE}: {e}")
     print("✓ Configuration saved to config.json")
 
-def edit_llm_settings(config):
-    """Edit LLM-related settings."""
-    print("\n=== LLM Settings ===")
-    settings = config["llm_settings"]
-    
-    print(f"Current model: {settings['model']}")
-    new_model = input(f"Enter new model (or press Enter to keep '{settings['model']}'): ").strip()
-    if new_model:
-        settings['model'] = new_model
-    
-    print(f"Current temperature: {settings['temperature']}")
-    new_temp = input(f"Enter new temperature 0-1 (or press Enter to keep {settings['temperature']}): ").strip()
-    if new_temp:
-        try:
-            settings['temperature'] = float(new_temp)
-        except ValueError:
-            print("Invalid temperature, keeping current value")
-    
-    print(f"Current max_tokens: {settings['max_tokens']}")
-    new_tokens = input(f"Enter new max_tokens (or press Enter to keep {settings['max_tokens']}): ").strip()
-    if new_tokens:
-        try:
-            settings['max_tokens'] = int(new_tokens)
-        except ValueError:
-            print("Invalid max_tokens, keeping current value")
-    
-    print(f"Current top_p: {settings['top_p']}")
-    new_top_p = input(f"Enter new top_p 0-1 (or press Enter to keep {settings['top_p']}): ").strip()
-    if new_top_p:
-        try:
-            settings['top_p'] = float(new_top_p)
-        except ValueError:
-            print("Invalid top_p, keeping current value")
+# Set by main(); piped sessions skip input() and its per-prompt readline machinery
+_interactive = True
 
-def edit_extraction_settings(config):
-    """Edit text extraction settings."""
-    print("\n=== Extraction Settings ===")
-    settings = config["extraction_settings"]
-    
-    print(f"Current case_sensitive: {settings['case_sensitive']}")
-    new_case = input("Case sensitive matching? (y/n or press Enter to keep current): ").strip().lower()
-    if new_case in ['y', 'yes']:
-        settings['case_sensitive'] = True
-    elif new_case in ['n', 'no']:
-        settings['case_sensitive'] = False
-    
-    print(f"Current fuzzy_matching: {settings['fuzzy_matching']}")
-    new_fuzzy = input("Enable fuzzy matching? (y/n or press Enter to keep current): ").strip().lower()
-    if new_fuzzy in ['y', 'yes']:
-        settings['fuzzy_matching'] = True
-    elif new_fuzzy in ['n', 'no']:
-        settings['fuzzy_matching'] = False
-    
-    print(f"Current max_intro_length: {settings['max_intro_length']}")
-    new_max = input(f"Enter max introduction length (or press Enter to keep {settings['max_intro_length']}): ").strip()
-    if new_max:
-        try:
-            settings['max_intro_length'] = int(new_max)
-        except ValueError:
-            print("Invalid length, keeping current value")
-    
-    print(f"Current fallback_intro_length: {settings['fallback_intro_length']}")
-    new_fallback = input(f"Enter fallback length (or press Enter to keep {settings['fallback_intro_length']}): ").strip()
-    if new_fallback:
-        try:
-            settings['fallback_intro_length'] = int(new_fallback)
-        except ValueError:
-            print("Invalid length, keeping current value")
+def _ask(prompt):
+    """Prompt for one line of input, like input() but cheaper when stdin is piped."""
+    if _interactive:
+        return input(prompt)
+    sys.stdout.write(prompt)
+    sys.stdout.flush()
+    line = sys.stdin.readline()
+    if not line:
+        raise EOFError
+    return line.rstrip("\n")
+
+_YES = frozenset({"y", "yes", "true", "1"})
+_NO = frozenset({"n", "no", "false", "0"})
+
+def _yn(prompt, default):
+    """Ask a yes/no question; any other answer returns default."""
+    answer = _ask(prompt).strip().lower()
+    return True if answer in _YES else False if answer in _NO else default
 
-def edit_output_settings(config):
-    """Edit output-related settings."""
-    print("\n=== Output Settings ===")
-    settings = config["output_settings"]
+# Editable fields per config section: (key, type, validator, prompt)
+# Boolean fields are asked as y/n questions; validators may be None.
+_LLM_FIELDS = [
+    ("model", str, None, "Enter new model"),
+    ("temperature", float, lambda x: 0 <= x <= 1, "Enter new temperature 0-1"),
+    ("max_tokens", int, lambda x: x > 0, "Enter new max_tokens"),
+    ("top_p", float, lambda x: 0 <= x <= 1, "Enter new top_p 0-1"),
+    ("concurrency", int, lambda x: x > 0, "Enter max concurrent API requests"),
+    ("max_batch_size", int, lambda x: x > 0, "Enter max papers per API request"),
+    ("max_input_tokens", int, lambda x: x > 0, "Enter input token budget per API request"),
+    ("tokens_per_section", int, lambda x: x > 0, "Enter output tokens reserved per analysis section"),
+    ("context_window", int, lambda x: x > 0, "Enter model context window in tokens"),
+]
+
+_EXTRACTION_FIELDS = [
+    ("case_sensitive", bool, None, "Case sensitive matching?"),
+    ("fuzzy_matching", bool, None, "Enable fuzzy matching?"),
+    ("fuzzy_early_exit", float, lambda x: 0.6 < x <= 1, "Enter similarity at which fuzzy search stops early 0.6-1"),
+    ("max_intro_length", int, lambda x: x > 0, "Enter max introduction length"),
+    ("fallback_intro_length", int, lambda x: x > 0, "Enter fallback length"),
+    ("pdf_backend", str, lambda x: x in ("pymupdf", "pdfplumber"), "Enter PDF backend (pymupdf/pdfplumber)"),
+    ("max_intro_pages", int, lambda x: x > 0, "Enter max pages to read after the start marker"),
+]
+
+_OUTPUT_FIELDS = [
+    ("save_raw_intros", bool, None, "Save raw introduction text files?"),
+    ("use_cache", bool, None, "Reuse cached introductions and analyses from earlier runs?"),
+]
+
+_RATE_LIMIT_FIELDS = [
+    ("max_requests_per_minute", int, lambda x: x > 0, "Enter max API requests per minute"),
+    ("max_tokens_per_minute", int, lambda x: x > 0, "Enter max API tokens per minute"),
+]
+
+# Field tables by section name, used to check values pasted as a JSON patch
+_SECTION_FIELDS = {
+    "llm_settings": _LLM_FIELDS,
+    "extraction_settings": _EXTRACTION_FIELDS,
+    "output_settings": _OUTPUT_FIELDS,
+    "rate_limits": _RATE_LIMIT_FIELDS,
+}
+
+def _patch_value_ok(section_name, key, value):
+    """Check a pasted value against the field's type and validator, like edit_section does."""
+    fields = {field[0]: field[1:3] for field in _SECTION_FIELDS.get(section_name, ())}
+    if key in fields:
+        caster, validator = fields[key]
+    elif key in _DEFAULT_SETTINGS.get(section_name, {}):
+        caster, validator = type(_DEFAULT_SETTINGS[section_name][key]), None
+    else:
+        return True  # Settings this editor does not know about are kept as given
+    if caster is float:
+        ok = isinstance(value, (int, float)) and not isinstance(value, bool)
+    else:
+        ok = type(value) is caster
+    return ok and (validator is None or validator(value))
+
+def edit_section(config, section_name, fields, title):
+    """Prompt for each field of a config section, keeping values left blank."""
+    print(f"\n=== {title} ===")
+    # Configs written before a setting existed (or loaded without msgspec) may lack it
+    defaults = create_default_config()[section_name]
+    settings = config.setdefault(section_name, {})
     
-    print(f"Current rate_limit_delay: {settings['rate_limit_delay']} seconds")
-    new_delay = input(f"Enter delay between API calls in seconds (or press Enter to keep {settings['rate_limit_delay']}): ").strip()
-    if new_delay:
+    for key, caster, validator, prompt in fields:
+        current = settings.setdefault(key, defaults[key])
+        print(f"Current {key}: {current}")
+        
+        if caster is bool:
+            settings[key] = _yn(f"{prompt} (y/n or press Enter to keep current): ", current)
+            continue
+        
+        answer = _ask(f"{prompt} (or press Enter to keep {current!r}): ").strip()
+        if not answer:
+            continue
         try:
-            settings['rate_limit_delay'] = float(new_delay)
+            value = caster(answer)
         except ValueError:
-            print("Invalid delay, keeping current value")
+            value = None
+        if value is None or (validator is not None and not validator(value)):
+            print(f"Invalid {key}, keeping current value")
+            continue
+        settings[key] = value
+
+def paste_json_patch(config):
+    """Apply a one-line JSON patch such as {"llm_settings": {"temperature": 0.2}}."""
+    line = _ask("Paste JSON patch on one line: ").strip()
+    if not line:
+        return
+    try:
+        patch = _json_loads(line)
+    except ValueError as e:
+        print(f"Invalid JSON ({e}), no changes applied")
+        return
+    if not isinstance(patch, dict):
+        print("Patch must be a JSON object keyed by section name, no changes applied")
+        return
     
-    print(f"Current save_raw_intros: {settings['save_raw_intros']}")
-    new_save = input("Save raw introduction text files? (y/n or press Enter to keep current): ").strip().lower()
-    if new_save in ['y', 'yes']:
-        settings['save_raw_intros'] = True
-    elif new_save in ['n', 'no']:
-        settings['save_raw_intros'] = False
+    for section_name, values in patch.items():
+        if not isinstance(config.get(section_name), dict) or not isinstance(values, dict):
+            print(f"Skipping unknown section '{section_name}'")
+            continue
+        valid = {}
+        for key, value in values.items():
+            if _patch_value_ok(section_name, key, value):
+                valid[key] = value
+            else:
+                print(f"Invalid {section_name}.{key}: {value!r}, keeping current value")
+        if valid:
+            config[section_name].update(valid)
+            print(f"✓ Updated {section_name}: {', '.join(valid)}")
 
 def view_config(config):
     """Display current configuration."""
     print("\n=== Current Configuration ===")
-    print(json.dumps(config, indent=2, ensure_ascii=False))
+    print(_json_dumps(config).decode('utf-8'))
 
 def main():
     """Main configuration editor."""
+    global _interactive
+    _interactive = sys.stdin.isatty()
+    if not _interactive:
+        # Scripted run: let output accumulate and flush only when prompting
+        sys.stdout.reconfigure(line_buffering=False, write_through=False)
+    
     print("=== Economic Paper Analyzer - Configuration Editor ===")
     
     config = load_config()
@@ -161,24 +345,25 @@ def main():
         print("1. View current configuration")
         print("2. Edit LLM settings (model, temperature, etc.)")
         print("3. Edit extraction settings (fuzzy matching, etc.)")
-        print("4. Edit output settings (delays, file saving)")
+        print("4. Edit output settings (file saving, caching)")
         print("5. Reset to defaults")
         print("6. Save and exit")
         print("7. Exit without saving")
+        print("8. Paste a JSON patch (bulk edit)")
+        print("9. Edit rate limits (requests/tokens per minute)")
         
-        choice = input("\nEnter your choice (1-7): ").strip()
+        choice = _ask("\nEnter your choice (1-9): ").strip()
         
         if choice == '1':
             view_config(config)
         elif choice == '2':
-            edit_llm_settings(config)
+            edit_section(config, "llm_settings", _LLM_FIELDS, "LLM Settings")
         elif choice == '3':
-            edit_extraction_settings(config)
+            edit_section(config, "extraction_settings", _EXTRACTION_FIELDS, "Extraction Settings")
         elif choice == '4':
-            edit_output_settings(config)
+            edit_section(config, "output_settings", _OUTPUT_FIELDS, "Output Settings")
         elif choice == '5':
-            confirm = input("Reset to defaults? This will overwrite current settings (y/n): ").strip().lower()
-            if confirm in ['y', 'yes']:
+            if _yn("Reset to defaults? This will overwrite current settings (y/n): ", False):
                 config = create_default_config()
                 print("✓ Configuration reset to defaults")
         elif choice == '6':
@@ -187,8 +372,12 @@ def main():
         elif choice == '7':
             print("Exiting without saving changes.")
             break
+        elif choice == '8':
+            paste_json_patch(config)
+        elif choice == '9':
+            edit_section(config, "rate_limits", _RATE_LIMIT_FIELDS, "Rate Limits")
         else:
-            print("Invalid choice. Please enter 1-7.")
+            print("Invalid choice. Please enter 1-9.")
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -6,15 +6,33 @@ where users can manually specify the start and end of introduction sections.
 
 import os
 import json
-import PyPDF2
 from pathlib import Path
-import re
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the stdlib encoder
+    orjson = None
+
+# Blank annotation record; copied and given a title for each paper
+_TEMPLATE = {
+    "title": "",
+    "type": "",            # To be filled manually: "theoretical" or "empirical"
+    "start_of_intro": "",  # To be filled manually
+    "end_of_intro": "",    # To be filled manually
+    "notes": ""            # Optional field for additional notes
+}
+
+def _json_dumps(obj, indent=False):
+    """Serialize obj to UTF-8 JSON bytes."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0)
+    return json.dumps(obj, indent=2 if indent else None, ensure_ascii=False).encode('utf-8')
 
 def extract_title_from_pdf(pdf_path):
     """
     Use filename (without extension) as the title.
     """
-    return Path(pdf_path).stem
+    return os.path.basename(pdf_path).rsplit('.', 1)[0]
 
 def scan_papers_and_generate_json():
     """
@@ -27,7 +45,8 @@ def scan_papers_and_generate_json():
         return
     
     # Find all PDF files
-    pdf_files = list(papers_folder.glob("*.pdf"))
+    with os.scandir(papers_folder) as it:
+        pdf_files = [e.name for e in it if e.is_file() and e.name.lower().endswith(".pdf")]
     
     if not pdf_files:
         print("No PDF files found in papers_to_read folder.")
@@ -35,30 +54,33 @@ def scan_papers_and_generate_json():
     
     print(f"Found {len(pdf_files)} PDF files")
     
-    # Generate data structure
-    papers_data = {}
-    
-    for pdf_file in pdf_files:
-        print(f"Processing: {pdf_file.name}")
-        
-        # Extract title
-        title = extract_title_from_pdf(pdf_file)
-        
-        # Create entry
-        papers_data[pdf_file.name] = {
-            "title": title,
-            "type": "",            # To be filled manually: "theoretical" or "empirical"
-            "start_of_intro": "",  # To be filled manually
-            "end_of_intro": "",    # To be filled manually
-            "notes": ""            # Optional field for additional notes
-        }
-    
-    # Save to JSON file
+    # Stream entries straight to the output file instead of building the whole dict first.
+    # Write to a temp file and swap it in, so an interrupted run never leaves a truncated file.
     output_file = "papers_annotation.json"
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(papers_data, f, indent=2, ensure_ascii=False)
+    tmp_file = output_file + ".tmp"
+    last = len(pdf_files) - 1
+    
+    with open(tmp_file, 'wb') as f:
+        f.write(b'{\n')
+        for i, name in enumerate(pdf_files):
+            print(f"Processing: {name}")
+            
+            # Extract title
+            title = extract_title_from_pdf(name)
+            
+            # Create entry
+            entry = _TEMPLATE.copy()
+            entry["title"] = title
+            
+            # Nest the record one level deeper to match an indent=2 dump of the whole file
+            record = _json_dumps(entry, indent=True).replace(b'\n', b'\n  ')
+            f.write(b'  ' + _json_dumps(name) + b': ' + record + (b',\n' if i < last else b'\n'))
+        f.write(b'}\n')
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_file, output_file)
     
-    print(f"\nGenerated {output_file} with {len(papers_data)} papers")
+    print(f"\nGenerated {output_file} with {len(pdf_files)} papers")
     print("\nPlease fill in the following fields manually:")
     print("1. 'type': Either 'theoretical' or 'empirical'")
     print("2. 'start_of_intro' and 'end_of_intro': Text patterns that identify the introduction section")
@@ -6,19 +6,71 @@ from PDFs, and uses Tongyi Qwen Plus to analyze and structure the information.
 
 import os
 import json
+import asyncio
+import gzip
+import hashlib
 import pdfplumber
+from pdfminer.pdftypes import PDFStream, resolve1
 from pathlib import Path
 from tqdm import tqdm
 import dashscope
 from dashscope import Generation
+from dashscope.api_entities import http_request as dashscope_http
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import time
 import re
+import contextlib
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from itertools import accumulate
+from dataclasses import dataclass, field
 from dotenv import load_dotenv
-import difflib
+from rapidfuzz import fuzz, process
+from edit_config import create_default_config
+
+try:
+    import pymupdf as fitz  # PyMuPDF >= 1.24.3
+except ImportError:
+    try:
+        import fitz  # Older PyMuPDF releases
+    except ImportError:  # PyMuPDF is optional; pdfplumber is used instead
+        fitz = None
+
+try:
+    import tiktoken
+except ImportError:  # tiktoken is optional; prompt tokens are estimated from length instead
+    tiktoken = None
 
 # Load environment variables from .env file
 load_dotenv()
 
+# Patterns are compiled once at import rather than on every marker search
+_WS_RE = re.compile(r'\s+')
+_NL_RUN_RE = re.compile(r'\s*\n\s*')
+_SPACE_RUN_RE = re.compile(r'[^\S\n]+')
+
+# Heading patterns tried when an "introduction" marker is not found verbatim
+_INTRO_MARKER_PATTERNS = (
+    r'\b\d+\.\s*introduction\b',
+    r'\bintroduction\b',
+    r'\bintro\b',
+    r'\b1\s+introduction\b',
+    r'\bsection\s+\d+.*introduction\b'
+)
+_INTRO_MARKER_PATTERNS_CI = [re.compile(p, re.IGNORECASE) for p in _INTRO_MARKER_PATTERNS]
+_INTRO_MARKER_PATTERNS_CS = [re.compile(p) for p in _INTRO_MARKER_PATTERNS]
+
+# Last-resort patterns used when the start marker cannot be found at all
+_INTRO_FALLBACK_PATTERNS = (
+    r'\b1\.\s*introduction\b',
+    r'\bintroduction\b',
+    r'\b1\s+introduction\b'
+)
+_INTRO_FALLBACK_PATTERNS_CI = [re.compile(p, re.IGNORECASE) for p in _INTRO_FALLBACK_PATTERNS]
+_INTRO_FALLBACK_PATTERNS_CS = [re.compile(p) for p in _INTRO_FALLBACK_PATTERNS]
+
 def load_config(config_file="config.json"):
     """
     Load configuration settings from JSON file.
@@ -28,27 +80,7 @@ def load_config(config_file="config.json"):
             return json.load(f)
     except FileNotFoundError:
         print(f"Config file {config_file} not found. Using default settings.")
-        return {
-            "llm_settings": {
-                "model": "qwen-plus",
-                "temperature": 0,
-                "max_tokens": 16000,
-                "top_p": 0.8
-            },
-            "extraction_settings": {
-                "case_sensitive": False,
-                "fuzzy_matching": True,
-                "max_intro_length": 32000,
-                "fallback_intro_length": 20000,
-                "search_flexibility": True
-            },
-            "output_settings": {
-                "save_raw_intros": True,
-                "markdown_format": True,
-                "include_metadata": True,
-                "rate_limit_delay": 0.2,
-            }
-        }
+        return create_default_config()
     except json.JSONDecodeError as e:
         print(f"Error parsing config file: {e}. Using default settings.")
         return load_config.__defaults__[0] if hasattr(load_config, '__defaults__') else {}
@@ -65,18 +97,81 @@ def load_annotation_file(filename="papers_annotation.json"):
     with open(filename, 'r', encoding='utf-8') as f:
         return json.load(f)
 
-def find_flexible_marker(text, marker, config, search_type="start"):
+# On-disk cache of extracted introductions and analyses, keyed by content hashes
+CACHE_DIR = Path(".cache")
+# Extracted introductions saved for the user; reused on reruns when still current
+RAW_INTROS_DIR = Path("raw_intros")
+
+def _cache_enabled(config):
+    return config["output_settings"].get("use_cache", True)
+
+def _hash_key(*parts):
+    """
+    Hex digest identifying a cache entry built from the given parts.
+    """
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(str(part).encode('utf-8'))
+        h.update(b'\0')
+    return h.hexdigest()
+
+def _config_hash(settings):
+    return hashlib.blake2b(json.dumps(settings, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+
+def _file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def _cache_get(key):
+    """
+    Return the cached value for key, or None if it is missing or unreadable.
+    """
+    try:
+        with gzip.open(CACHE_DIR / f"{key}.json.gz", 'rt', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, EOFError, ValueError):
+        return None
+
+def _cache_put(key, value):
+    """
+    Store value under key. Written to a temp file first so concurrent workers never see partial entries.
+    """
+    path = CACHE_DIR / f"{key}.json.gz"
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    try:
+        CACHE_DIR.mkdir(exist_ok=True)
+        with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+            json.dump(value, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"Warning: could not write cache entry {path}: {e}")
+
+def _analysis_cache_key(prompt, config):
+    llm_settings = config.get("llm_settings", {})
+    # The output limit actually sent depends on all three token settings (see output_token_budget)
+    return _hash_key("analysis", prompt, llm_settings.get("model"), llm_settings.get("temperature"),
+                     llm_settings.get("top_p"), llm_settings.get("max_tokens"),
+                     llm_settings.get("tokens_per_section", 256), llm_settings.get("context_window", 131072))
+
+def find_flexible_marker(text, marker, config, search_type="start", normalized=None, start=0):
     """
     Find marker in text with flexible matching strategies.
+    Only matches at or after `start` are considered; the returned position is an index into text.
+    text is expected to be whitespace-normalized as by _normalize_page_text. `normalized` is text
+    with line breaks turned into spaces (lowercased unless case-sensitive), computed here if not given.
     """
     if not marker:
         return -1
     
     # Strategy 1: Exact match (case-sensitive or not)
-    if config["extraction_settings"]["case_sensitive"]:
-        pos = text.find(marker)
+    case_sensitive = config["extraction_settings"]["case_sensitive"]
+    if case_sensitive:
+        pos = text.find(marker, start)
     else:
-        pos = text.lower().find(marker.lower())
+        pos = text.lower().find(marker.lower(), start)
     
     if pos != -1:
         return pos
@@ -84,89 +179,254 @@ def find_flexible_marker(text, marker, config, search_type="start"):
     if not config["extraction_settings"]["search_flexibility"]:
         return -1
     
-    # Strategy 2: Fuzzy matching with difflib
+    # Strategy 1.5: Exact match ignoring differences in whitespace (line breaks, repeated spaces),
+    # the usual reason a marker copied from a PDF viewer misses the extracted text
+    if normalized is None:
+        normalized = (text if case_sensitive else text.lower()).replace('\n', ' ')
+    needle = _WS_RE.sub(' ', marker.strip())
+    pos = normalized.find(needle if case_sensitive else needle.lower(), start) if needle else -1
+    if pos != -1:
+        print(f"Found {search_type} marker after normalizing whitespace")
+        return pos
+    
+    text = text[start:]
+    
+    # Strategy 2: Fuzzy matching with RapidFuzz (same ratio as difflib, implemented in C)
     if config["extraction_settings"]["fuzzy_matching"]:
         lines = text.split('\n')
-        best_match_pos = -1
-        best_ratio = 0.6  # Minimum similarity threshold
+        # Start offset of each line in text, so a match maps back without rescanning
+        offsets = [0, *accumulate(len(line) + 1 for line in lines[:-1])]
         
-        for i, line in enumerate(lines):
-            line_clean = re.sub(r'\s+', ' ', line.strip())
-            marker_clean = re.sub(r'\s+', ' ', marker.strip())
-            
-            if not config["extraction_settings"]["case_sensitive"]:
-                line_clean = line_clean.lower()
-                marker_clean = marker_clean.lower()
-            
-            ratio = difflib.SequenceMatcher(None, line_clean, marker_clean).ratio()
-            if ratio > best_ratio:
-                best_ratio = ratio
-                # Find position of this line in original text
-                best_match_pos = text.find(lines[i])
+        # Lines are already whitespace-normalized; they are lowercased lazily so an early exit
+        # also skips the rest
+        marker_clean = _WS_RE.sub(' ', marker.strip())
+        lines_clean = lines
+        if not config["extraction_settings"]["case_sensitive"]:
+            marker_clean = marker_clean.lower()
+            lines_clean = (line.lower() for line in lines)
+        
+        # Keep the best line above the 0.6 similarity threshold, but stop at the first
+        # near-exact hit: markers are short and nearly unique, so it is almost always right
+        early_exit = config["extraction_settings"].get("fuzzy_early_exit", 0.95) * 100
+        best_score, best_i = 0, -1
+        for _, score, i in process.extract_iter(marker_clean, lines_clean, scorer=fuzz.ratio, score_cutoff=60):
+            if score > best_score:
+                best_score, best_i = score, i
+                if score >= early_exit:
+                    break
         
-        if best_match_pos != -1:
-            print(f"Found {search_type} marker using fuzzy matching (similarity: {best_ratio:.2f})")
+        if best_i != -1:
+            best_match_pos = start + offsets[best_i]
+            print(f"Found {search_type} marker using fuzzy matching (similarity: {best_score / 100:.2f})")
             return best_match_pos
     
     # Strategy 3: Pattern-based matching
-    patterns = []
-    marker_lower = marker.lower() if not config["extraction_settings"]["case_sensitive"] else marker
+    marker_lower = marker.lower() if not case_sensitive else marker
     
     # Common introduction patterns
     if "introduction" in marker_lower:
-        patterns.extend([
-            r'\b\d+\.\s*introduction\b',
-            r'\bintroduction\b',
-            r'\bintro\b',
-            r'\b1\s+introduction\b',
-            r'\bsection\s+\d+.*introduction\b'
-        ])
-    
-    # Try regex patterns
-    flags = re.IGNORECASE if not config["extraction_settings"]["case_sensitive"] else 0
-    for pattern in patterns:
-        match = re.search(pattern, text, flags)
-        if match:
-            print(f"Found {search_type} marker using pattern: {pattern}")
-            return match.start()
+        for rx in (_INTRO_MARKER_PATTERNS_CS if case_sensitive else _INTRO_MARKER_PATTERNS_CI):
+            match = rx.search(text)
+            if match:
+                print(f"Found {search_type} marker using pattern: {rx.pattern}")
+                return start + match.start()
     
     return -1
 
+def get_pdf_backend(config):
+    """
+    Return the PDF backend that will actually be used: "pymupdf" or "pdfplumber".
+    """
+    backend = config["extraction_settings"].get("pdf_backend", "pdfplumber")
+    if backend == "pymupdf" and fitz is None:
+        return "pdfplumber"
+    return backend
+
+def _resources_have_fonts(resources, depth=0):
+    """
+    True if a pdfminer resource dict references a font, directly or via a form XObject.
+    """
+    resources = resolve1(resources)
+    if not isinstance(resources, dict):
+        return False
+    if resolve1(resources.get("Font")):
+        return True
+    if depth >= 8:  # Guard against cyclic form references
+        return False
+    xobjects = resolve1(resources.get("XObject"))
+    for xobject in (xobjects.values() if isinstance(xobjects, dict) else ()):
+        xobject = resolve1(xobject)
+        if (isinstance(xobject, PDFStream) and getattr(xobject.get("Subtype"), "name", None) == "Form"
+                and _resources_have_fonts(xobject.get("Resources"), depth + 1)):
+            return True
+    return False
+
+def _page_has_text(page):
+    """
+    Cheap check that a page can contain text at all, i.e. it uses a font.
+    Image-only pages (scans, cover sheets, figures) are skipped without decoding their content.
+    """
+    if fitz is not None and isinstance(page, fitz.Page):
+        return bool(page.get_fonts())
+    return _resources_have_fonts(page.page_obj.resources)
+
+def _release_page(page):
+    """
+    Drop a pdfplumber page's cached layout, objects and text map once its text has been read.
+    The PDF object keeps every page it has handed out, so otherwise memory grows with each page.
+    """
+    page.flush_cache()
+    page.get_textmap.cache_clear()
+
+def _iter_page_texts(pdf_path, config):
+    """
+    Yield the text of each page in order, using the configured PDF backend.
+    Pages are read one at a time on purpose: PyMuPDF documents must not be shared between
+    threads, and reading lazily lets the caller stop once the introduction is found.
+    Parallelism comes from extracting several PDFs in separate processes instead.
+    """
+    if get_pdf_backend(config) == "pymupdf":
+        with fitz.open(pdf_path) as doc:
+            for page in doc:
+                yield page.get_text("text") if _page_has_text(page) else ""
+    else:
+        with pdfplumber.open(pdf_path) as pdf:
+            for page in pdf.pages:
+                page_text = page.extract_text() if _page_has_text(page) else ""
+                _release_page(page)
+                yield page_text
+
+def _normalize_page_text(text):
+    """
+    Collapse whitespace in one page's text: runs containing a line break become a single
+    newline (fuzzy matching works line by line), other runs a single space.
+    """
+    return _SPACE_RUN_RE.sub(' ', _NL_RUN_RE.sub('\n', text)).strip()
+
+def _raw_intro_meta(start_marker, end_marker, config):
+    """
+    Settings a saved raw introduction was extracted with, stored next to it.
+    """
+    return {
+        "start_of_intro": start_marker,
+        "end_of_intro": end_marker,
+        "config_hash": _config_hash(config["extraction_settings"])
+    }
+
+def _load_raw_introduction(pdf_path, start_marker, end_marker, config):
+    """
+    Return the introduction saved in raw_intros by an earlier run, if it is newer than the
+    PDF and was extracted with the same markers and settings; otherwise None.
+    """
+    intro_file = RAW_INTROS_DIR / f"{Path(pdf_path).stem}_intro.txt"
+    meta_file = intro_file.with_suffix(".meta.json")
+    try:
+        if intro_file.stat().st_mtime <= os.stat(pdf_path).st_mtime:
+            return None
+        with open(meta_file, 'r', encoding='utf-8') as f:
+            if json.load(f) != _raw_intro_meta(start_marker, end_marker, config):
+                return None
+        return intro_file.read_text(encoding='utf-8') or None
+    except (OSError, ValueError):
+        return None
+
 def extract_introduction_from_pdf(pdf_path, start_marker, end_marker, config):
     """
     Extract introduction section from PDF with flexible matching.
+    Results are cached on disk by PDF content, markers and extraction settings; an up-to-date
+    file in raw_intros is reused without even hashing the PDF.
     """
+    if not _cache_enabled(config):
+        return _extract_introduction(pdf_path, start_marker, end_marker, config)
+    
+    introduction = _load_raw_introduction(pdf_path, start_marker, end_marker, config)
+    if introduction is not None:
+        print(f"Reusing saved introduction for {Path(pdf_path).name}")
+        return introduction
+    
     try:
-        with pdfplumber.open(pdf_path) as pdf:
-            full_text = ""
-            for page in pdf.pages:
-                page_text = page.extract_text()
-                if page_text:
-                    full_text += page_text + "\n"
+        key = _hash_key("intro", _file_sha256(pdf_path), start_marker, end_marker,
+                        _config_hash(config["extraction_settings"]))
+    except OSError:
+        # Unreadable file; let the extraction report the error
+        return _extract_introduction(pdf_path, start_marker, end_marker, config)
+    
+    introduction = _cache_get(key)
+    if introduction is None:
+        introduction = _extract_introduction(pdf_path, start_marker, end_marker, config)
+        if introduction:
+            _cache_put(key, introduction)
+    return introduction
+
+def _extract_introduction(pdf_path, start_marker, end_marker, config):
+    try:
+        case_sensitive = config["extraction_settings"]["case_sensitive"]
+        max_intro_pages = config["extraction_settings"].get("max_intro_pages", 10)
+        # Page text is whitespace-normalized, so the markers are too
+        start_needle = _WS_RE.sub(' ', start_marker.strip())
+        end_needle = _WS_RE.sub(' ', end_marker.strip())
+        if not case_sensitive:
+            start_needle, end_needle = start_needle.lower(), end_needle.lower()
         
-        if not full_text.strip():
+        # Read pages until both markers have been seen verbatim, or the intro has run past
+        # max_intro_pages; the flexible search below then works on the pages read so far.
+        # Pages are collected in lists and joined once at the end.
+        parts = []
+        search_parts = []  # parts, lowercased when matching is case-insensitive
+        text_len = 0  # length of "\n".join(parts)
+        overlap = max(len(start_needle), len(end_needle))
+        start_page = None
+        end_from = 0  # offset in the joined text after which the end marker is looked for
+        for page_num, page_text in enumerate(_iter_page_texts(pdf_path, config)):
+            page_text = _normalize_page_text(page_text) if page_text else ""
+            if not page_text:
+                continue
+            search_page = page_text if case_sensitive else page_text.lower()
+            
+            # Search the new page together with the end of the previous one, in case a marker
+            # straddles the page break; window_pos is the window's offset in the joined text
+            tail = search_parts[-1][-overlap:] + "\n" if search_parts else ""
+            window = tail + search_page
+            window_pos = text_len - len(tail) + (1 if parts else 0)
+            text_len = window_pos + len(window)
+            parts.append(page_text)
+            search_parts.append(search_page)
+            
+            if not (start_needle and end_needle):
+                continue
+            if start_page is None:
+                exact_start = window.find(start_needle)
+                if exact_start == -1:
+                    continue
+                start_page = page_num
+                end_from = window_pos + exact_start + len(start_needle)
+            
+            if (window.find(end_needle, max(0, end_from - window_pos)) != -1
+                    or page_num - start_page + 1 >= max_intro_pages):
+                break
+        
+        full_text = "\n".join(parts)
+        search_text = "\n".join(search_parts)
+        if not full_text:
             print(f"Warning: No extractable text found in {pdf_path}")
             return None
         
+        # Single-line view of search_text for whitespace-insensitive matching, shared by both searches
+        normalized = search_text.replace('\n', ' ')
+        
         # Find start position with flexible matching
-        start_pos = find_flexible_marker(full_text, start_marker, config, "start")
+        start_pos = find_flexible_marker(full_text, start_marker, config, "start", normalized)
         if start_pos == -1:
             print(f"Warning: Start marker '{start_marker}' not found in {pdf_path}")
             print("Trying alternative strategies...")
             
             # Fallback: Look for common introduction patterns
-            intro_patterns = [
-                r'\b1\.\s*introduction\b',
-                r'\bintroduction\b',
-                r'\b1\s+introduction\b'
-            ]
-            flags = re.IGNORECASE if not config["extraction_settings"]["case_sensitive"] else 0
-            
-            for pattern in intro_patterns:
-                match = re.search(pattern, full_text, flags)
+            case_sensitive = config["extraction_settings"]["case_sensitive"]
+            for rx in (_INTRO_FALLBACK_PATTERNS_CS if case_sensitive else _INTRO_FALLBACK_PATTERNS_CI):
+                match = rx.search(full_text)
                 if match:
                     start_pos = match.start()
-                    print(f"Found introduction using fallback pattern: {pattern}")
+                    print(f"Found introduction using fallback pattern: {rx.pattern}")
                     break
             
             if start_pos == -1:
@@ -174,7 +434,8 @@ def extract_introduction_from_pdf(pdf_path, start_marker, end_marker, config):
                 return None
         
         # Find end position with flexible matching
-        end_pos = find_flexible_marker(full_text[start_pos + len(start_marker):], end_marker, config, "end")
+        end_pos = find_flexible_marker(full_text, end_marker, config, "end", normalized,
+                                       start=start_pos + len(start_marker))
         
         if end_pos == -1:
             print(f"Warning: End marker '{end_marker}' not found, using fallback length")
@@ -182,8 +443,6 @@ def extract_introduction_from_pdf(pdf_path, start_marker, end_marker, config):
             fallback_length = config["extraction_settings"]["fallback_intro_length"]
             introduction = full_text[start_pos:start_pos + fallback_length]
         else:
-            # Adjust end_pos to be relative to full_text
-            end_pos = start_pos + len(start_marker) + end_pos
             introduction = full_text[start_pos:end_pos]
         
         # Limit maximum introduction length
@@ -192,9 +451,8 @@ def extract_introduction_from_pdf(pdf_path, start_marker, end_marker, config):
             introduction = introduction[:max_length]
             print(f"Truncated introduction to {max_length} characters")
         
-        # Clean up the text
-        introduction = re.sub(r'\s+', ' ', introduction)  # Normalize whitespace
-        introduction = introduction.strip()
+        # Clean up the text; whitespace is already collapsed, only line breaks remain
+        introduction = introduction.replace('\n', ' ').strip()
         
         if len(introduction) < 100:
             print(f"Warning: Extracted introduction is very short ({len(introduction)} chars)")
@@ -205,9 +463,50 @@ def extract_introduction_from_pdf(pdf_path, start_marker, end_marker, config):
         print(f"Error extracting introduction from {pdf_path}: {e}")
         return None
 
-def analyze_with_qwen(introduction_text, paper_title, paper_type, config):
+# Markdown prompt text for each known analysis section (theoretical and empirical templates)
+_SECTION_MAP = {
+    # Theoretical paper sections
+    "Research Problem": "### Research Problem\n- What specific question does this paper address?\n\n",
+    "Significance & Motivation": "### Significance & Motivation\n- Why is this problem important or interesting?\n- How is it connected to existing work?\n- How does it differ from existing work?\n\n",
+    "Main Findings & Intuition": "### Main Findings & Intuition\n- What is the paper's answer to the research question?\n- What's the key intuition or mechanism?\n\n",
+    "Model Setup & Assumptions": "### Model Setup & Assumptions\n- What is the basic model structure?\n- What are the key assumptions?\n- How do these assumptions relate to the research question?\n\n",
+    "Methodological Contributions": "### Methodological Contributions\n- Does this paper have any methodological contributions?\n- If yes, what are the key methodological innovations?\n\n",
+    "Policy Implications": "### Policy Implications\n- What are the policy recommendations or implications?\n\n",
+    "Key Insights": "### Key Insights\n- Additional important takeaways\n\n",
+    
+    # Empirical paper sections
+    "Research Question": "### Research Question\n- What empirical question does this paper investigate?\n- What is the main hypothesis being tested?\n\n",
+    "Main Findings": "### Main Findings\n- What are the main empirical results?\n\n",
+    "Data": "### Data\n- What data sources are used?\n- What is the sample period and coverage?\n- What are the key variables?\n\n",
+    "Identification Strategy": "### Identification Strategy\n- How does the paper establish causal identification?\n- What is the source of exogenous variation?\n- What are potential threats to identification?\n\n",
+    "Robustness & Limitations": "### Robustness & Limitations\n- What robustness checks are mentioned?\n- What are the main limitations of the approach?\n\n",
+}
+
+def _default_section(section):
     """
-    Send introduction text to Tongyi Qwen Plus for analysis using config settings.
+    Generic prompt text for a section not listed in _SECTION_MAP.
+    """
+    return f"### {section}\n[Analyze this aspect of the paper]\n\n"
+
+_DEFAULT_SYSTEM_INSTRUCTION = "You are an expert economist analyzing research papers. Focus on economic insights and contributions rather than technical details."
+
+def _analysis_sections(paper_type, config):
+    """
+    Return (system_instruction, sections) for a paper type, falling back to the theoretical
+    template for unknown types and to a basic section list when no template is configured.
+    """
+    if paper_type not in ["theoretical", "empirical"]:
+        paper_type = "theoretical"
+    
+    type_template = config.get("prompt_template", {}).get(paper_type, {})
+    if not type_template:
+        return _DEFAULT_SYSTEM_INSTRUCTION, ["Research Problem", "Methodology", "Findings", "Implications"]
+    return (type_template.get("system_instruction", _DEFAULT_SYSTEM_INSTRUCTION),
+            type_template.get("analysis_sections", ["Analysis"]))
+
+def _prompt_parts(paper_type, config):
+    """
+    Resolve the system instruction and the requested-sections text for a paper type.
     Uses different prompt templates based on paper type (theoretical vs empirical).
     """
     
@@ -216,57 +515,21 @@ def analyze_with_qwen(introduction_text, paper_title, paper_type, config):
         print(f"Warning: Unknown paper type '{paper_type}'. Using theoretical template as fallback.")
         paper_type = "theoretical"
     
-    # Get type-specific prompt template
-    prompt_templates = config.get("prompt_template", {})
-    type_template = prompt_templates.get(paper_type, {})
-    
-    if not type_template:
+    if not config.get("prompt_template", {}).get(paper_type):
         print(f"Warning: No template found for paper type '{paper_type}'. Using fallback.")
-        # Fallback to basic template
-        sections = ["Research Problem", "Methodology", "Findings", "Implications"]
-        system_instruction = "You are an expert economist analyzing research papers. Focus on economic insights and contributions rather than technical details."
-    else:
-        sections = type_template.get("analysis_sections", ["Analysis"])
-        system_instruction = type_template.get("system_instruction", 
-            "You are an expert economist analyzing research papers. Focus on economic insights and contributions rather than technical details.")
+    
+    system_instruction, sections = _analysis_sections(paper_type, config)
     
     # Build sections for prompt
-    sections_text = ""
-    for section in sections:
-        # Theoretical paper sections
-        if section == "Research Problem":
-            sections_text += f"### {section}\n- What specific question does this paper address?\n\n"
-        elif section == "Significance & Motivation":
-            sections_text += f"### {section}\n- Why is this problem important or interesting?\n- How is it connected to existing work?\n- How does it differ from existing work?\n\n"
-        elif section == "Main Findings & Intuition":
-            sections_text += f"### {section}\n- What is the paper's answer to the research question?\n- What's the key intuition or mechanism?\n\n"
-        elif section == "Model Setup & Assumptions":
-            sections_text += f"### {section}\n- What is the basic model structure?\n- What are the key assumptions?\n- How do these assumptions relate to the research question?\n\n"
-        elif section == "Methodological Contributions":
-            sections_text += f"### {section}\n- Does this paper have any methodological contributions?\n- If yes, what are the key methodological innovations?\n\n"
-        elif section == "Policy Implications":
-            sections_text += f"### {section}\n- What are the policy recommendations or implications?\n\n"
-        elif section == "Key Insights":
-            sections_text += f"### {section}\n- Additional important takeaways\n\n"
-        
-        # Empirical paper sections
-        elif section == "Research Question":
-            sections_text += f"### {section}\n- What empirical question does this paper investigate?\n- What is the main hypothesis being tested?\n\n"
-        elif section == "Significance & Motivation":
-            sections_text += f"### {section}\n- Why is this problem important or interesting?\n- How is it connected to existing work?\n- How does it differ from existing work?\n\n"
-        elif section == "Main Findings":
-            sections_text += f"### {section}\n- What are the main empirical results?\n\n"
-        elif section == "Data":
-            sections_text += f"### {section}\n- What data sources are used?\n- What is the sample period and coverage?\n- What are the key variables?\n\n"
-        elif section == "Identification Strategy":
-            sections_text += f"### {section}\n- How does the paper establish causal identification?\n- What is the source of exogenous variation?\n- What are potential threats to identification?\n\n"
-        elif section == "Robustness & Limitations":
-            sections_text += f"### {section}\n- What robustness checks are mentioned?\n- What are the main limitations of the approach?\n\n"
-        elif section == "Policy Implications":
-            sections_text += f"### {section}\n- What are the policy recommendations or implications?\n\n"
-        # Generic fallback
-        else:
-            sections_text += f"### {section}\n[Analyze this aspect of the paper]\n\n"
+    sections_text = "".join(_SECTION_MAP.get(section) or _default_section(section) for section in sections)
+    
+    return system_instruction, sections_text
+
+def build_analysis_prompt(introduction_text, paper_title, paper_type, config):
+    """
+    Build the analysis prompt for one paper.
+    """
+    system_instruction, sections_text = _prompt_parts(paper_type, config)
     
     prompt = f"""{system_instruction}
 
@@ -280,7 +543,52 @@ Introduction Text:
 Please provide a structured analysis in the following format:
 
 {sections_text}Focus on economic intuitions, insights and contributions rather than technical details. Please be concise, clear and accurate."""
+    
+    return prompt
+
+def _make_http_session():
+    """
+    Create the pooled HTTP session shared by all DashScope requests.
+    Rate-limit and server errors are retried with backoff; the final response is still
+    returned to dashscope so its status and message are reported as before.
+    """
+    retry = Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504],
+                  allowed_methods=None, raise_on_status=False)  # None: retry POST too
+    adapter = HTTPAdapter(pool_connections=16, pool_maxsize=64, max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
 
+class _SharedSessionRequests:
+    """
+    Stand-in for the requests module inside dashscope, which opens (and closes) a new
+    requests.Session for every call. Session() hands out one long-lived session instead,
+    so TCP and TLS connections are reused across requests.
+    """
+    def __init__(self, session):
+        self._session = session
+    
+    def Session(self):
+        return contextlib.nullcontext(self._session)
+    
+    def __getattr__(self, name):
+        return getattr(requests, name)
+
+def use_shared_http_session():
+    """
+    Route dashscope's HTTP calls through a shared connection pool.
+    Skipped if this dashscope version no longer uses the requests module directly.
+    """
+    if getattr(dashscope_http, "requests", None) is requests:
+        dashscope_http.requests = _SharedSessionRequests(_make_http_session())
+
+def _generate(prompt, config, max_tokens=None):
+    """
+    Send a prompt to Tongyi Qwen Plus using config settings.
+    Returns (text, finish_reason), or (None, None) on error. `max_tokens` overrides the
+    configured limit for this request; finish_reason "length" means the text was cut off there.
+    """
     # Get LLM settings from config
     llm_settings = config.get("llm_settings", {})
     
@@ -289,26 +597,156 @@ Please provide a structured analysis in the following format:
             model=llm_settings.get("model", "qwen-plus"),
             prompt=prompt,
             temperature=llm_settings.get("temperature", 0),
-            max_tokens=llm_settings.get("max_tokens", 32000),
+            max_tokens=max_tokens or llm_settings.get("max_tokens", 32000),
             top_p=llm_settings.get("top_p", 0.8)
         )
         
         if response.status_code == 200:
-            return response.output.text
+            return response.output.text, response.output.finish_reason
         else:
             print(f"Error from Qwen API: {response.message}")
-            return None
+            return None, None
             
     except Exception as e:
         print(f"Error calling Qwen API: {e}")
+        return None, None
+
+def call_qwen(prompt, config, max_tokens=None):
+    """
+    Send a prompt to Tongyi Qwen Plus using config settings. Returns the response text, or None
+    on error or if the response was cut off at max_tokens.
+    """
+    text, finish_reason = _generate(prompt, config, max_tokens)
+    if finish_reason == "length":
+        print(f"Warning: response cut off at max_tokens={max_tokens}")
         return None
+    return text
+
+def analyze_with_qwen(introduction_text, paper_title, paper_type, config):
+    """
+    Send introduction text to Tongyi Qwen Plus for analysis using config settings.
+    """
+    prompt = build_analysis_prompt(introduction_text, paper_title, paper_type, config)
+    max_tokens = output_token_budget(count_tokens(prompt), paper_type, 1, config)
+    return call_qwen(prompt, config, max_tokens)
+
+# Marks the end of each paper's analysis in a batched response
+_BATCH_SENTINEL = "<<<END OF ANALYSIS>>>"
+# Rough per-paper token cost of the title and separators in a batched prompt
+_BATCH_OVERHEAD_TOKENS = 200
+_ANALYSIS_HEADER_RE = re.compile(r'^[ \t#*]*ANALYSIS\s+(\d+)[ \t*:]*$', re.MULTILINE)
+
+def build_batch_prompt(items, config):
+    """
+    Build one prompt asking for separate analyses of several papers.
+    `items` is a list of (title, paper_type, intro_text); all items must share the same paper type.
+    """
+    system_instruction, sections_text = _prompt_parts(items[0][1], config)
+    
+    papers_text = ""
+    for i, (title, _, intro_text) in enumerate(items, 1):
+        papers_text += f"=== PAPER {i} ===\nPaper Title: {title}\n\nIntroduction Text:\n{intro_text}\n\n"
+    
+    prompt = f"""{system_instruction}
+
+Please analyze the introduction sections of the following {len(items)} economic research papers. Treat each paper independently and extract key information in a structured format.
+
+{papers_text}For each paper, in the order given, start with a line "## ANALYSIS <n>" (where <n> is the paper number), then provide a structured analysis in the following format:
+
+{sections_text}End each paper's analysis with a line containing only {_BATCH_SENTINEL}
+
+Focus on economic intuitions, insights and contributions rather than technical details. Please be concise, clear and accurate."""
+    
+    return prompt
+
+def split_batch_response(response_text, count):
+    """
+    Split a batched response into `count` analyses, in paper order.
+    Each analysis runs from its "## ANALYSIS <n>" header to the sentinel; analyses that are
+    missing, or not closed by the sentinel (e.g. cut off), are returned as None.
+    """
+    analyses = [None] * count
+    if not response_text:
+        return analyses
+    
+    headers = list(_ANALYSIS_HEADER_RE.finditer(response_text))
+    for match, next_match in zip(headers, headers[1:] + [None]):
+        block = response_text[match.end():next_match.start() if next_match else len(response_text)]
+        if _BATCH_SENTINEL not in block:
+            continue
+        index = int(match.group(1)) - 1
+        if 0 <= index < count and analyses[index] is None:
+            analyses[index] = block.split(_BATCH_SENTINEL, 1)[0].strip() or None
+    
+    return analyses
+
+def estimate_tokens(text):
+    """
+    Rough token count for rate limiting (about 4 characters per token for English text).
+    """
+    return len(text) // 4
 
-def save_analysis_as_markdown(paper_filename, title, analysis, paper_type=None, output_folder="output"):
+_TOKENIZER = None  # tiktoken encoding set by load_tokenizer(); counts are estimated without it
+
+def load_tokenizer(timeout=10):
+    """
+    Load tiktoken's cl100k_base encoding for count_tokens. On first use tiktoken downloads it
+    with no timeout, so the load runs in a daemon thread that is abandoned after `timeout` seconds.
+    """
+    global _TOKENIZER
+    if tiktoken is None:
+        return
+    result = {}
+    
+    def load():
+        try:
+            result["encoding"] = tiktoken.get_encoding("cl100k_base")
+        except Exception as e:  # e.g. the encoding file cannot be downloaded
+            result["error"] = e
+    
+    thread = threading.Thread(target=load, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    if "encoding" in result:
+        _TOKENIZER = result["encoding"]
+    else:
+        print(f"Warning: tiktoken unavailable ({result.get('error', 'timed out')}); estimating token counts instead")
+
+def count_tokens(text):
+    """
+    Token count of a prompt: counted with tiktoken's cl100k_base encoding when it has been
+    loaded (close to, though not the same as, Qwen's tokenizer), otherwise estimated.
+    """
+    if _TOKENIZER is None:
+        return estimate_tokens(text)
+    return len(_TOKENIZER.encode(text, disallowed_special=()))
+
+def output_token_budget(prompt_tokens, paper_type, paper_count, config):
+    """
+    max_tokens for a request analyzing paper_count papers of one type: tokens_per_section for each
+    requested section of each paper, capped by the configured max_tokens and by the room the
+    prompt leaves in the model's context window. Reserving only what the answer needs keeps
+    token-per-minute headroom free for other requests.
+    """
+    llm_settings = config.get("llm_settings", {})
+    _, sections = _analysis_sections(paper_type, config)
+    needed = llm_settings.get("tokens_per_section", 256) * len(sections) * paper_count
+    return min(needed, max_output_tokens(prompt_tokens, config))
+
+def max_output_tokens(prompt_tokens, config):
+    """
+    Largest max_tokens a request may use: the configured max_tokens, limited to the room the
+    prompt leaves in the model's context window.
+    """
+    llm_settings = config.get("llm_settings", {})
+    room = llm_settings.get("context_window", 131072) - prompt_tokens - 64
+    return max(1, min(llm_settings.get("max_tokens", 16000), room))
+
+async def save_analysis_as_markdown(paper_filename, title, analysis, paper_type=None, output_folder="output"):
     """
-    Save the analysis as a markdown file.
+    Save the analysis as a markdown file. The output folder must already exist.
     """
     output_folder = Path(output_folder)
-    output_folder.mkdir(exist_ok=True)
     
     # Create filename from paper filename
     base_name = Path(paper_filename).stem
@@ -332,26 +770,275 @@ def save_analysis_as_markdown(paper_filename, title, analysis, paper_type=None,
 *This analysis was generated automatically using Tongyi Qwen Plus.*
 """
     
-    with open(output_file, 'w', encoding='utf-8') as f:
-        f.write(markdown_content)
+    # Write in a worker thread so the event loop keeps serving other papers
+    await asyncio.to_thread(output_file.write_text, markdown_content, encoding='utf-8')
     
     return output_file
 
-def save_raw_introduction(paper_filename, introduction_text, output_folder="raw_intros"):
+async def save_raw_introduction(paper_filename, introduction_text, output_folder=RAW_INTROS_DIR, meta=None):
     """
-    Save the extracted introduction text to raw_intros folder.
+    Save the extracted introduction text to raw_intros folder. The folder must already exist.
+    `meta` (see _raw_intro_meta) is saved alongside so later runs can reuse the file.
     """
     output_folder = Path(output_folder)
-    output_folder.mkdir(exist_ok=True)
     
     base_name = Path(paper_filename).stem
     output_file = output_folder / f"{base_name}_intro.txt"
     
-    with open(output_file, 'w', encoding='utf-8') as f:
-        f.write(introduction_text)
+    await asyncio.to_thread(output_file.write_text, introduction_text, encoding='utf-8')
+    if meta is not None:
+        await asyncio.to_thread(output_file.with_suffix(".meta.json").write_text, json.dumps(meta), encoding='utf-8')
     
     return output_file
 
+@dataclass
+class RateBucket:
+    """
+    Request and token buckets refilled continuously from per-minute API limits.
+    A request is dispatched only when both buckets have room for it.
+    """
+    max_requests_per_minute: float
+    max_tokens_per_minute: float
+    available_request_capacity: float = field(init=False)
+    available_token_capacity: float = field(init=False)
+    last_update_time: float = field(default_factory=time.monotonic)
+    
+    def __post_init__(self):
+        self.available_request_capacity = self.max_requests_per_minute
+        self.available_token_capacity = self.max_tokens_per_minute
+    
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self.last_update_time
+        self.last_update_time = now
+        self.available_request_capacity = min(
+            self.max_requests_per_minute,
+            self.available_request_capacity + elapsed * self.max_requests_per_minute / 60)
+        self.available_token_capacity = min(
+            self.max_tokens_per_minute,
+            self.available_token_capacity + elapsed * self.max_tokens_per_minute / 60)
+    
+    async def acquire(self, tokens):
+        """
+        Wait until one request and `tokens` tokens are available, then consume them.
+        """
+        # A single request larger than the whole bucket would otherwise wait forever
+        tokens = min(tokens, self.max_tokens_per_minute)
+        while True:
+            self._refill()
+            if self.available_request_capacity >= 1 and self.available_token_capacity >= tokens:
+                self.available_request_capacity -= 1
+                self.available_token_capacity -= tokens
+                return
+            wait = max(
+                (1 - self.available_request_capacity) * 60 / self.max_requests_per_minute,
+                (tokens - self.available_token_capacity) * 60 / self.max_tokens_per_minute)
+            await asyncio.sleep(max(wait, 0.01))
+
+async def extract_one(filename, data, pdf_path, paper_type, config, pool):
+    """
+    Extract (and optionally save) one paper's introduction.
+    Returns (filename, data, paper_type, introduction), or None on failure.
+    """
+    print(f"\nProcessing: {filename} (type: {paper_type})")
+    
+    # Extract introduction with config-based flexibility; PDF parsing runs in a worker process
+    loop = asyncio.get_running_loop()
+    try:
+        introduction = await loop.run_in_executor(
+            pool,
+            extract_introduction_from_pdf,
+            pdf_path, 
+            data['start_of_intro'], 
+            data['end_of_intro'],
+            config
+        )
+    except Exception as e:
+        # extract_introduction_from_pdf handles its own errors; this catches a crashed worker
+        print(f"Error extracting introduction from {pdf_path}: {e}")
+        introduction = None
+    
+    if not introduction:
+        print(f"Failed to extract introduction from {filename}")
+        return None
+    
+    # Save raw introduction if enabled in config
+    if config['output_settings']['save_raw_intros']:
+        raw_file = await save_raw_introduction(
+            filename, introduction,
+            meta=_raw_intro_meta(data['start_of_intro'], data['end_of_intro'], config))
+        print(f"Saved raw introduction to: {raw_file}")
+    
+    return filename, data, paper_type, introduction
+
+def _paper_cache_key(paper, config):
+    """
+    Analysis cache key for an extracted paper, based on its single-paper prompt so that
+    results are reused whichever batch the paper lands in.
+    """
+    _, data, paper_type, introduction = paper
+    return _analysis_cache_key(build_analysis_prompt(introduction, data['title'], paper_type, config), config)
+
+async def analyze_batch(batch, config, sem, bucket):
+    """
+    Analyze a batch of extracted papers (all of one type) in a single request and save the results.
+    Papers missing from a batched response are retried on their own. Returns the number saved.
+    """
+    if len(batch) == 1:
+        filename, data, paper_type, introduction = batch[0]
+        prompt = build_analysis_prompt(introduction, data['title'], paper_type, config)
+    else:
+        prompt = build_batch_prompt([(data['title'], paper_type, introduction)
+                                     for _, data, paper_type, introduction in batch], config)
+    
+    prompt_tokens = count_tokens(prompt)
+    max_tokens = output_token_budget(prompt_tokens, batch[0][2], len(batch), config)
+    
+    names = ", ".join(paper[0] for paper in batch)
+    
+    # Analyze with Qwen using config, at most `concurrency` requests in flight.
+    # A response cut off at the sized-down max_tokens is requested again with the full limit.
+    while True:
+        async with sem:
+            await bucket.acquire(prompt_tokens + max_tokens)
+            print(f"Analyzing {names} with Tongyi Qwen Plus using {batch[0][2]} template...")
+            response_text, finish_reason = await asyncio.to_thread(_generate, prompt, config, max_tokens)
+        if finish_reason != "length":
+            break
+        ceiling = max_output_tokens(prompt_tokens, config)
+        if max_tokens >= ceiling:
+            # Keep what is complete: split_batch_response drops an analysis missing its sentinel
+            print(f"Warning: analysis of {names} cut off at max_tokens={max_tokens}")
+            if len(batch) == 1:
+                response_text = None
+            break
+        print(f"Analysis of {names} cut off at max_tokens={max_tokens}, retrying with {ceiling}")
+        max_tokens = ceiling
+    
+    if len(batch) == 1:
+        analyses = [response_text]
+    else:
+        analyses = split_batch_response(response_text, len(batch))
+    
+    saved = 0
+    for paper, analysis in zip(batch, analyses):
+        filename, data, paper_type, _ = paper
+        if not analysis:
+            if len(batch) > 1:
+                print(f"No analysis for {filename} in batched response, retrying on its own")
+                saved += await analyze_batch([paper], config, sem, bucket)
+            else:
+                print(f"Failed to analyze {filename}")
+            continue
+        
+        if _cache_enabled(config):
+            _cache_put(_paper_cache_key(paper, config), analysis)
+        
+        # Save analysis as markdown
+        output_file = await save_analysis_as_markdown(filename, data['title'], analysis, paper_type)
+        print(f"Saved analysis to: {output_file}")
+        saved += 1
+    
+    return saved
+
+async def process_all(annotations, papers_folder, config):
+    """
+    Validate annotations, then extract and analyze all valid papers concurrently.
+    Extracted papers are grouped by type into batches that fit the input token budget.
+    Returns (processed_count, failed_count).
+    """
+    processed_count = 0
+    failed_count = 0
+    
+    llm_settings = config['llm_settings']
+    sem = asyncio.Semaphore(max(1, llm_settings.get('concurrency', 4)))
+    rate_limits = config.get('rate_limits', {})
+    bucket = RateBucket(
+        rate_limits.get('max_requests_per_minute', 600),
+        rate_limits.get('max_tokens_per_minute', 1000000))
+    max_batch_size = max(1, llm_settings.get('max_batch_size', 4))
+    max_input_tokens = llm_settings.get('max_input_tokens', 32000)
+    
+    papers = []
+    
+    for filename, data in annotations.items():
+        if not data.get('start_of_intro') or not data.get('end_of_intro'):
+            print(f"Skipping {filename}: start_of_intro or end_of_intro not filled")
+            failed_count += 1
+            continue
+        
+        # Validate paper type
+        paper_type = data.get('type', '').lower()
+        if not paper_type:
+            print(f"Skipping {filename}: paper type not specified")
+            failed_count += 1
+            continue
+        
+        if paper_type not in ['theoretical', 'empirical']:
+            print(f"Skipping {filename}: invalid paper type '{paper_type}'. Must be 'theoretical' or 'empirical'")
+            failed_count += 1
+            continue
+        
+        pdf_path = papers_folder / filename
+        if not pdf_path.exists():
+            print(f"Skipping {filename}: PDF file not found")
+            failed_count += 1
+            continue
+        
+        papers.append((filename, data, pdf_path, paper_type))
+    
+    progress = tqdm(total=len(papers), desc="Processing papers")
+    
+    def dispatch(batch):
+        task = asyncio.ensure_future(analyze_batch(batch, config, sem, bucket))
+        task.add_done_callback(lambda _: progress.update(len(batch)))
+        return task
+    
+    # Buffer extracted papers per type; dispatch a batch once the next paper would not fit.
+    # PDFs are parsed in parallel worker processes while earlier batches are being analyzed.
+    analyze_tasks = []
+    pending = {}
+    # One worker per paper at most, so a handful of large PDFs does not start idle processes
+    with ProcessPoolExecutor(max_workers=max(1, min(os.cpu_count() or 1, len(papers)))) as pool:
+        extract_tasks = [extract_one(*paper, config, pool) for paper in papers]
+        for next_done in asyncio.as_completed(extract_tasks):
+            paper = await next_done
+            if paper is None:
+                failed_count += 1
+                progress.update(1)
+                continue
+            
+            # Reuse a cached analysis of the same introduction and prompt settings
+            if _cache_enabled(config):
+                analysis = _cache_get(_paper_cache_key(paper, config))
+                if analysis is not None:
+                    output_file = await save_analysis_as_markdown(paper[0], paper[1]['title'], analysis, paper[2])
+                    print(f"Saved cached analysis to: {output_file}")
+                    processed_count += 1
+                    progress.update(1)
+                    continue
+            
+            paper_type, introduction = paper[2], paper[3]
+            tokens = estimate_tokens(introduction) + _BATCH_OVERHEAD_TOKENS
+            batch, batch_tokens = pending.get(paper_type, ([], 0))
+            if batch and (len(batch) >= max_batch_size or batch_tokens + tokens > max_input_tokens):
+                analyze_tasks.append((dispatch(batch), len(batch)))
+                batch, batch_tokens = [], 0
+            batch.append(paper)
+            pending[paper_type] = (batch, batch_tokens + tokens)
+    
+    for batch, _ in pending.values():
+        if batch:
+            analyze_tasks.append((dispatch(batch), len(batch)))
+    
+    for task, batch_size in analyze_tasks:
+        saved = await task
+        processed_count += saved
+        failed_count += batch_size - saved
+    
+    progress.close()
+    return processed_count, failed_count
+
 def main():
     """
     Main function to process all papers.
@@ -369,15 +1056,20 @@ def main():
     
     # Set up dashscope
     dashscope.api_key = os.getenv('DASHSCOPE_API_KEY')
+    use_shared_http_session()
     
     # Display configuration
     print("=== Configuration ===")
     print(f"Model: {config['llm_settings']['model']}")
     print(f"Temperature: {config['llm_settings']['temperature']}")
     print(f"Max tokens: {config['llm_settings']['max_tokens']}")
+    print(f"Concurrent requests: {config['llm_settings'].get('concurrency', 4)}")
     print(f"Case sensitive matching: {config['extraction_settings']['case_sensitive']}")
     print(f"Fuzzy matching: {config['extraction_settings']['fuzzy_matching']}")
-    print(f"Rate limit delay: {config['output_settings']['rate_limit_delay']}s")
+    print(f"PDF backend: {get_pdf_backend(config)}")
+    rate_limits = config.get('rate_limits', {})
+    print(f"Rate limits: {rate_limits.get('max_requests_per_minute', 600)} requests/min, "
+          f"{rate_limits.get('max_tokens_per_minute', 1000000)} tokens/min")
     print()
     
     # Load annotation data
@@ -386,74 +1078,18 @@ def main():
         return
     
     papers_folder = Path("papers_to_read")
-    processed_count = 0
-    failed_count = 0
+    
+    # Create the output folders once instead of on every save
+    Path("output").mkdir(exist_ok=True)
+    if config['output_settings']['save_raw_intros']:
+        RAW_INTROS_DIR.mkdir(exist_ok=True)
     
     print(f"Processing {len(annotations)} papers...")
     
-    for filename, data in tqdm(annotations.items(), desc="Processing papers"):
-        if not data.get('start_of_intro') or not data.get('end_of_intro'):
-            print(f"Skipping {filename}: start_of_intro or end_of_intro not filled")
-            failed_count += 1
-            continue
-        
-        # Validate paper type
-        paper_type = data.get('type', '').lower()
-        if not paper_type:
-            print(f"Skipping {filename}: paper type not specified")
-            failed_count += 1
-            continue
-        
-        if paper_type not in ['theoretical', 'empirical']:
-            print(f"Skipping {filename}: invalid paper type '{paper_type}'. Must be 'theoretical' or 'empirical'")
-            failed_count += 1
-            continue
-        
-        pdf_path = papers_folder / filename
-        if not pdf_path.exists():
-            print(f"Skipping {filename}: PDF file not found")
-            failed_count += 1
-            continue
-        
-        print(f"\nProcessing: {filename} (type: {paper_type})")
-        
-        # Extract introduction with config-based flexibility
-        introduction = extract_introduction_from_pdf(
-            pdf_path, 
-            data['start_of_intro'], 
-            data['end_of_intro'],
-            config
-        )
-        
-        if not introduction:
-            print(f"Failed to extract introduction from {filename}")
-            failed_count += 1
-            continue
-        
-        # Save raw introduction if enabled in config
-        if config['output_settings']['save_raw_intros']:
-            raw_file = save_raw_introduction(filename, introduction)
-            print(f"Saved raw introduction to: {raw_file}")
-        
-        # Analyze with Qwen using config
-        print(f"Analyzing with Tongyi Qwen Plus using {paper_type} template...")
-        analysis = analyze_with_qwen(introduction, data['title'], paper_type, config)
-        
-        if not analysis:
-            print(f"Failed to analyze {filename}")
-            failed_count += 1
-            continue
-        
-        # Save analysis as markdown
-        output_file = save_analysis_as_markdown(filename, data['title'], analysis, paper_type)
-        print(f"Saved analysis to: {output_file}")
-        
-        processed_count += 1
-        
-        # Rate limiting from config
-        rate_delay = config['output_settings']['rate_limit_delay']
-        if rate_delay > 0:
-            time.sleep(rate_delay)
+    # Load the tokenizer up front; doing it lazily would block the event loop mid-run
+    load_tokenizer()
+    
+    processed_count, failed_count = asyncio.run(process_all(annotations, papers_folder, config))
     
     print(f"\n=== Processing Complete ===")
     print(f"Successfully processed: {processed_count}")